@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+grafo_csr.py
+------------
+Carga compartida de data/grafo_unificado.json para kcore_analisis.py,
+louvain_export.py y visualizar_grafo.py.
+
+- Parsea el property graph ('nodes' y 'edges') a arrays NumPy
+- Colapsa a grafo simple no dirigido como CSR simétrica (peso = multiplicidad)
+- Se queda con la componente conexa más grande (LCC)
+- Cachea el resultado en <json>.csr.npz; mientras el JSON no cambie (mtime_ns y
+  tamaño exactos) y CACHE_VERSION coincida, las siguientes ejecuciones solo leen el .npz
+- node_degrees: grado por nodo común a los scripts (lazo = 2, como NetworkX)
+- write_csv: exportación CSV común (utf-8-sig; pyarrow si está)
+
+Requisitos:
+    pip install numpy pandas scipy
+    (opcional) pip install orjson pyarrow
+"""
+
+import codecs
+import json
+import os
+import tempfile
+import warnings
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+try:
+    import orjson  # parser JSON en C, opcional
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow as pa  # escritor CSV en C (multihilo), opcional
+    import pyarrow.csv as pacsv
+except ImportError:
+    pa = pacsv = None
+
+# Subir si cambia la construcción (build_csr / LCC) o el formato del .npz
+CACHE_VERSION = 3
+
+
+def read_property_graph(json_path: Path):
+    """Lee el JSON (property graph) y devuelve arrays paralelos (node_ids, labels, src, tgt)."""
+    raw = json_path.read_bytes()
+    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+    # Nodos: arrays pre-dimensionados, rellenados en un solo bucle
+    nodes = data.get("nodes", [])
+    node_ids = np.empty(len(nodes), dtype=object)
+    labels = np.empty(len(nodes), dtype=object)
+    set_id, set_label = node_ids.__setitem__, labels.__setitem__
+    for i, n in enumerate(nodes):
+        set_id(i, n.get("id"))
+        set_label(i, n.get("label") or "")
+    keep = node_ids.astype(bool)
+    node_ids, labels = node_ids[keep], labels[keep]
+
+    # Aristas: source/target como arrays, validados de una vez (descarta None y "")
+    edges = data.get("edges", [])
+    src = np.fromiter((e.get("source") for e in edges), dtype=object, count=len(edges))
+    tgt = np.fromiter((e.get("target") for e in edges), dtype=object, count=len(edges))
+    mask = src.astype(bool) & tgt.astype(bool)
+    return node_ids, labels, src[mask], tgt[mask]
+
+
+def build_csr(node_ids, labels, src, tgt):
+    """
+    Factoriza los ids y construye la adyacencia no dirigida como CSR simétrica.
+    Devuelve (A, ids, labels): A[i, j] = nº de aristas entre ids[i] e ids[j].
+    """
+    n_nodes, n_edges = len(node_ids), len(src)
+    codes, ids = pd.factorize(np.concatenate([node_ids, src, tgt]))
+    si = codes[n_nodes:n_nodes + n_edges]
+    ti = codes[n_nodes + n_edges:]
+    N = len(ids)
+
+    # Labels alineados con ids (los nodos que solo aparecen en aristas quedan en "")
+    node_labels = np.full(N, "", dtype=object)
+    node_labels[codes[:n_nodes]] = labels
+
+    # Clave canónica (min, max) empaquetada en uint64; np.unique cuenta multiplicidades
+    a = np.minimum(si, ti).astype(np.uint64)
+    b = np.maximum(si, ti).astype(np.uint64)
+    keys, w = np.unique((a << np.uint64(32)) | b, return_counts=True)
+    u = (keys >> np.uint64(32)).astype(np.int32)
+    v = (keys & np.uint64(0xFFFFFFFF)).astype(np.int32)
+    w = w.astype(np.int32)
+
+    # CSR simétrica: cada arista en ambos sentidos, los lazos (diagonal) una sola vez
+    off = u != v
+    rows = np.concatenate([u, v[off]])
+    cols = np.concatenate([v, u[off]])
+    A = sp.csr_matrix((np.concatenate([w, w[off]]), (rows, cols)), shape=(N, N))
+    return A, ids, node_labels
+
+
+def largest_connected_component(A, ids, labels):
+    """Restringe (A, ids, labels) a la LCC usando connected_components sobre la CSR."""
+    if A.shape[0] == 0:
+        return A, ids, labels
+    _n_comps, comp = connected_components(A, directed=False)
+    mask = comp == np.bincount(comp).argmax()
+    return A[mask][:, mask], ids[mask], labels[mask]
+
+
+def node_degrees(A) -> np.ndarray:
+    """
+    Grado de cada nodo (sin pesos) con la convención de NetworkX: un lazo cuenta 2.
+    En la CSR el lazo es una sola entrada en la diagonal, de ahí el + (diagonal != 0).
+    """
+    return np.diff(A.indptr) + (A.diagonal() != 0)
+
+
+def cache_path_for(json_path: Path) -> Path:
+    """Ruta del caché CSR asociado al JSON: data/grafo_unificado.csr.npz"""
+    return json_path.with_suffix(".csr.npz")
+
+
+def _encode_column(values):
+    """
+    Codifica un array de objetos para el .npz sin pickle, conservando el tipo:
+    - todo str -> bytes UTF-8 concatenados + offsets (sin el coste de '<U{maxlen}')
+    - todo int -> int64
+    Devuelve None si los tipos son mixtos (esa columna no se puede cachear).
+    """
+    if all(type(x) is str for x in values):
+        encoded = [x.encode("utf-8") for x in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return {"kind": "str", "blob": np.frombuffer(b"".join(encoded), dtype=np.uint8), "offsets": offsets}
+    if all(type(x) is int for x in values):
+        return {"kind": "int", "values": np.asarray(values, dtype=np.int64)}
+    return None
+
+
+def _decode_column(z, name):
+    """Inverso de _encode_column: devuelve un array de objetos (str o int de Python)."""
+    kind = str(z[f"{name}_kind"])
+    if kind == "int":
+        return z[f"{name}_values"].astype(object)
+    blob, offsets = z[f"{name}_blob"].tobytes(), z[f"{name}_offsets"]
+    out = np.empty(len(offsets) - 1, dtype=object)
+    for i in range(len(out)):
+        out[i] = blob[offsets[i]:offsets[i + 1]].decode("utf-8")
+    return out
+
+
+def _json_signature(json_path: Path) -> np.ndarray:
+    """(st_mtime_ns, st_size) del JSON; el caché solo vale si coincide exactamente."""
+    st = json_path.stat()
+    return np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+
+def _read_cache(cache: Path, source: np.ndarray):
+    """
+    Lee el .npz; devuelve None si se generó a partir de otro JSON (mtime_ns/tamaño
+    distintos, p. ej. tras un `cp -p` o un backup restaurado con mtime más antiguo).
+    Lanza ValueError si es de otra versión del formato.
+    """
+    with open(cache, "rb") as f, np.load(f, allow_pickle=False) as z:
+        if int(z["version"]) != CACHE_VERSION:
+            raise ValueError(f"versión de caché {int(z['version'])} != {CACHE_VERSION}")
+        if not np.array_equal(z["source"], source):
+            return None
+        ids = _decode_column(z, "ids")
+        labels = _decode_column(z, "labels")
+        n = len(ids)
+        A = sp.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=(n, n))
+    return A, ids, labels
+
+
+def _write_cache(cache: Path, source: np.ndarray, A, ids, labels):
+    """Escribe el .npz en un temporal del mismo directorio y lo mueve con os.replace (atómico)."""
+    cols = {"ids": _encode_column(ids), "labels": _encode_column(labels)}
+    if any(c is None for c in cols.values()):
+        warnings.warn(f"ids/labels de tipos mixtos; no se guarda el caché {cache}")
+        return
+    arrays = {"version": np.int64(CACHE_VERSION), "source": source, "indptr": A.indptr, "indices": A.indices, "data": A.data}
+    for name, col in cols.items():
+        arrays.update({f"{name}_{k}": v for k, v in col.items()})
+
+    tmp = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=cache.parent, prefix=cache.name, suffix=".tmp", delete=False) as f:
+            tmp = Path(f.name)
+            np.savez(f, **arrays)
+        os.replace(tmp, cache)
+    except OSError as e:
+        warnings.warn(f"No se pudo guardar el caché {cache}: {e}")
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+
+
+def load_or_build_csr(json_path: Path):
+    """
+    Devuelve la LCC como (A, ids, labels), A = CSR simétrica.
+    Si <json>.csr.npz se generó a partir de este mismo JSON (mtime_ns y tamaño
+    iguales) y es de la versión actual, se carga de ahí; si no, o si está dañado,
+    se parsea el JSON, se construye la CSR y se guarda el caché para la próxima vez.
+    """
+    cache = cache_path_for(json_path)
+    source = _json_signature(json_path)  # antes de parsear: si el JSON cambia mientras, se nota
+    if cache.exists():
+        try:
+            cached = _read_cache(cache, source)
+            if cached is not None:
+                return cached
+        except (OSError, ValueError, zipfile.BadZipFile, KeyError) as e:
+            warnings.warn(f"Caché {cache} inválido ({e}); se reconstruye.")
+
+    node_ids, labels, src, tgt = read_property_graph(json_path)
+    A, ids, labels = build_csr(node_ids, labels, src, tgt)
+    A, ids, labels = largest_connected_component(A, ids, labels)
+    _write_cache(cache, source, A, ids, labels)
+    return A, ids, labels
+
+
+def write_csv(df: pd.DataFrame, path: Path):
+    """
+    Escribe df como CSV utf-8-sig (BOM para Excel); usa el escritor en C de pyarrow si está.
+    Ojo: pyarrow entrecomilla siempre la cabecera y los campos de texto (quoting_style
+    "needed" solo evita las comillas en números), así que el fichero no es byte a byte
+    igual al de df.to_csv, aunque se lee igual. "none" no sirve: falla con comas en el texto.
+    Si pyarrow no puede convertir alguna columna (tipos mixtos), se usa df.to_csv.
+    """
+    if pacsv is not None:
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            table = None  # columnas de objetos con tipos mixtos (p. ej. ids 1 y "2")
+    if pacsv is None or table is None:
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+        return
+    with path.open("wb") as f:
+        f.write(codecs.BOM_UTF8)
+        pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(include_header=True, quoting_style="needed"))
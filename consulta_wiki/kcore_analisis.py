@@ -8,43 +8,102 @@
 #   python onion_export.py
 #
 # Requisitos:
-#   pip install networkx pandas
+#   pip install pandas numpy scipy
+#   (opcional) pip install orjson numba pyarrow
+#   (usa grafo_csr.py; la CSR se cachea en data/grafo_unificado.csr.npz)
 
-import json
 from pathlib import Path
+import numpy as np
 import pandas as pd
-import networkx as nx
-from networkx.algorithms.core import onion_layers
-
-def load_property_graph(json_path: Path) -> nx.Graph:
-    """Carga el JSON (property graph) y devuelve la LCC como grafo simple no dirigido."""
-    with json_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Construir MultiDiGraph desde 'nodes' y 'edges'
-    Gm = nx.MultiDiGraph()
-    for n in data.get("nodes", []):
-        nid = n.get("id")
-        if nid:
-            Gm.add_node(nid, label=n.get("label") or "")
-    for e in data.get("edges", []):
-        s, t = e.get("source"), e.get("target")
-        if s and t:
-            Gm.add_edge(s, t)
-
-    # Colapsar a grafo simple no dirigido
-    G = nx.Graph()
-    G.add_nodes_from(Gm.nodes(data=True))
-    for u, v in Gm.edges():
-        if not G.has_edge(u, v):
-            G.add_edge(u, v)
-
-    # Quedarse con la componente conexa más grande
-    if G.number_of_nodes() > 0:
-        comps = list(nx.connected_components(G))
-        if comps:
-            G = G.subgraph(max(comps, key=len)).copy()
-    return G
+
+from grafo_csr import load_or_build_csr, node_degrees, write_csv
+
+try:
+    from numba import njit  # compila los bucles de k-core/onion, opcional
+except ImportError:
+    def njit(*args, **kwargs):
+        """Sin numba: deja las funciones como Python puro (mismo resultado, más lento)."""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda f: f
+
+@njit(cache=True)
+def _degrees_csr(indptr, indices):
+    """
+    Grado de cada nodo en la CSR sin contar lazos: solo para el pelado k-core/onion,
+    que no admite lazos (nx.core_number falla con ellos). El grado que se exporta
+    es el de grafo_csr.node_degrees.
+    """
+    n = len(indptr) - 1
+    deg = np.zeros(n, dtype=np.int64)
+    for v in range(n):
+        for j in range(indptr[v], indptr[v + 1]):
+            if indices[j] != v:
+                deg[v] += 1
+    return deg
+
+@njit(cache=True)
+def onion_decomposition_csr(indptr, indices):
+    """
+    Core number y capa onion de cada nodo en una sola pasada de pelado sobre la CSR
+    simétrica (mismos resultados que nx.core_number y nx.onion_layers).
+    En cada pasada se retiran todos los nodos vivos con grado <= core actual;
+    el core de un nodo es el core actual en el momento de retirarlo.
+    Los lazos se ignoran. Devuelve (core, layer).
+    """
+    n = len(indptr) - 1
+    deg = _degrees_csr(indptr, indices)
+    alive = np.ones(n, dtype=np.uint8)
+    core = np.zeros(n, dtype=np.int64)
+    layer = np.zeros(n, dtype=np.int64)
+
+    # Nodos aislados: core 0, capa 1; el resto queda en `pending` (vivos, compactado)
+    pending = np.empty(n, dtype=np.int64)
+    m = 0
+    for v in range(n):
+        if deg[v] == 0:
+            layer[v] = 1
+            alive[v] = 0
+        else:
+            pending[m] = v
+            m += 1
+    current_core = 1
+    current_layer = 2 if m < n else 1
+
+    this_layer = np.empty(n, dtype=np.int64)
+    while m > 0:
+        min_deg = deg[pending[0]]
+        for i in range(1, m):
+            if deg[pending[i]] < min_deg:
+                min_deg = deg[pending[i]]
+        if min_deg > current_core:
+            current_core = min_deg
+
+        # Separa la capa actual y compacta los que siguen vivos
+        k = 0
+        keep = 0
+        for i in range(m):
+            v = pending[i]
+            if deg[v] <= current_core:
+                this_layer[k] = v
+                k += 1
+                core[v] = current_core
+                layer[v] = current_layer
+                alive[v] = 0
+            else:
+                pending[keep] = v
+                keep += 1
+        m = keep
+
+        # Retira la capa: baja el grado de sus vecinos vivos
+        for i in range(k):
+            v = this_layer[i]
+            for j in range(indptr[v], indptr[v + 1]):
+                u = indices[j]
+                if alive[u]:
+                    deg[u] -= 1
+        current_layer += 1
+    return core, layer
 
 def main():
     BASE_DIR = Path(__file__).resolve().parent
@@ -54,44 +113,27 @@ def main():
     if not INPUT_JSON.exists():
         raise FileNotFoundError(f"No existe {INPUT_JSON}")
 
-    G = load_property_graph(INPUT_JSON)
-    if G.number_of_nodes() == 0:
+    A, ids, labels = load_or_build_csr(INPUT_JSON)
+    if len(ids) == 0:
         print("Grafo vacío.")
         return
 
-    # onion_layers puede devolver:
-    # - dict: nodo -> int(layer)  (algunas versiones)
-    # - dict: nodo -> (core, layer) (otras versiones)
-    ol = onion_layers(G)
-    core_num = nx.core_number(G)
-
-    rows = []
-    for n in G.nodes():
-        val = ol.get(n, None)
-        if isinstance(val, tuple) and len(val) == 2:
-            core_k, layer_j = val
-        else:
-            core_k = core_num.get(n, None)
-            layer_j = int(val) if val is not None else None
-
-        rows.append({
-            "node_id": n,
-            "label": G.nodes[n].get("label") or "",
-            "core": core_k,
-            "layer": layer_j,
-            "degree": G.degree(n),
-        })
-
-    df = pd.DataFrame(rows)
+    # k-core y onion layers en un solo pelado compilado sobre la CSR
+    core_num, ol = onion_decomposition_csr(A.indptr, A.indices)
 
-    # Asegurar tipos numéricos
-    df["layer"] = pd.to_numeric(df["layer"], errors="coerce")
-    df["degree"] = pd.to_numeric(df["degree"], errors="coerce").fillna(0).astype(int)
+    # DataFrame por columnas (arrays alineados con ids)
+    df = pd.DataFrame({
+        "node_id": ids,
+        "label": labels,
+        "core": core_num,
+        "layer": ol,
+        "degree": node_degrees(A).astype(np.int32),
+    })
 
     # Orden: layer descendente, degree descendente
     df = df.sort_values(by=["layer", "degree"], ascending=[False, False])
 
-    df.to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
+    write_csv(df, OUTPUT_CSV)
     print(f"CSV generado: {OUTPUT_CSV.resolve()}  ({len(df)} nodos)")
 
 if __name__ == "__main__":
@@ -8,7 +8,7 @@ Created on Thu Aug 21 11:35:26 2025
 # louvain_export.py
 # ---------------------------------------------
 # Lee data/grafo_unificado.json (claves 'nodes' y 'edges'),
-# calcula comunidades Louvain y exporta un CSV con:
+# calcula comunidades Louvain (o Leiden) y exporta un CSV con:
 #   node_id, label, community
 # ordenado por community asc y luego por label asc.
 #
@@ -16,55 +16,106 @@ Created on Thu Aug 21 11:35:26 2025
 #   python louvain_export.py
 #
 # Requisitos:
-#   pip install networkx python-louvain pandas
+#   pip install pandas numpy scipy
+#   pip install networkit  (o igraph / python-louvain + networkx; cugraph si hay GPU)
+#   (opcional) pip install orjson pyarrow
+#   (usa grafo_csr.py; la CSR se cachea en data/grafo_unificado.csr.npz)
 
-import json
+import random
+import warnings
 from pathlib import Path
+import numpy as np
 import pandas as pd
-import networkx as nx
-
-# Intentar importar python-louvain con manejo amigable
-try:
-    import community as community_louvain  # paquete: python-louvain
-except ImportError as e:
-    raise SystemExit(
-        "Falta el paquete 'python-louvain'. Instálalo con:\n"
-        "    pip install python-louvain\n"
-        f"Detalle: {e}"
+import scipy.sparse as sp
+
+from grafo_csr import load_or_build_csr, write_csv
+
+# Backends de Louvain, del más rápido al más portable. Cada uno importa su
+# paquete al usarse (networkit/igraph/cugraph tardan en cargar), así que el
+# script solo paga la importación del backend que de verdad se usa.
+
+def louvain_cugraph(A) -> np.ndarray:
+    """Louvain en GPU con cugraph; devuelve la comunidad de cada fila de A."""
+    import cudf
+    import cugraph  # Louvain en GPU (RAPIDS)
+
+    upper = sp.triu(A, format="coo")
+    edges = cudf.DataFrame({
+        "src": upper.row, "dst": upper.col, "w": upper.data.astype(np.float32),
+    })
+    g = cugraph.Graph()
+    g.from_cudf_edgelist(edges, source="src", destination="dst", edge_attr="w", renumber=False)
+    parts, _modularity = cugraph.louvain(g)
+    parts = parts.to_pandas()
+    membership = np.empty(A.shape[0], dtype=np.int64)
+    membership[parts["vertex"].to_numpy()] = parts["partition"].to_numpy()
+    return membership
+
+def louvain_networkit(A) -> np.ndarray:
+    """Louvain paralelo (PLM con refinamiento) de networkit sobre la CSR."""
+    import networkit as nk  # Louvain paralelo (PLM, OpenMP)
+
+    upper = sp.triu(A, format="coo")
+    G_nk = nk.GraphFromCoo(
+        (upper.data.astype(np.float64),
+         (upper.row.astype(np.uint64), upper.col.astype(np.uint64))),
+        n=A.shape[0], weighted=True,
+    )
+    nk.setSeed(42, False)
+    plm = nk.community.PLM(G_nk, refine=True, par="balanced")
+    plm.run()
+    return np.asarray(plm.getPartition().getVector(), dtype=np.int64)
+
+def leiden_igraph(A) -> np.ndarray:
+    """Leiden de igraph optimizando modularidad (peso = multiplicidad) sobre la CSR."""
+    import igraph as ig  # Leiden (Δ-modularidad en C)
+
+    upper = sp.triu(A, format="coo")
+    g_ig = ig.Graph(n=A.shape[0], edges=list(zip(upper.row.tolist(), upper.col.tolist())), directed=False)
+    g_ig.es["weight"] = upper.data.tolist()
+    ig.set_random_number_generator(random.Random(42))
+    part = g_ig.community_leiden(
+        objective_function="modularity", weights="weight", resolution=1.0, n_iterations=-1,
     )
+    return np.asarray(part.membership, dtype=np.int64)
 
-def load_property_graph(json_path: Path) -> nx.Graph:
-    """Carga el JSON (property graph) y devuelve la LCC como grafo simple no dirigido."""
-    with json_path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Construir MultiDiGraph desde 'nodes' y 'edges'
-    Gm = nx.MultiDiGraph()
-    for n in data.get("nodes", []):
-        nid = n.get("id")
-        if nid:
-            Gm.add_node(nid, label=n.get("label") or "")
-    for e in data.get("edges", []):
-        s, t = e.get("source"), e.get("target")
-        if s and t:
-            # guardamos multiplicidad como edges paralelos
-            Gm.add_edge(s, t)
-
-    # Colapsar a grafo simple no dirigido, acumulando peso por multiplicidad
-    G = nx.Graph()
-    G.add_nodes_from(Gm.nodes(data=True))
-    for u, v in Gm.edges():
-        if G.has_edge(u, v):
-            G[u][v]["weight"] += 1
-        else:
-            G.add_edge(u, v, weight=1)
-
-    # Quedarse con la componente conexa más grande
-    if G.number_of_nodes() > 0:
-        comps = list(nx.connected_components(G))
-        if comps:
-            G = G.subgraph(max(comps, key=len)).copy()
-    return G
+def louvain_python(A) -> np.ndarray:
+    """Louvain de python-louvain (un solo hilo) sobre un nx.Graph con nodos 0..N-1."""
+    import community as community_louvain  # paquete: python-louvain
+    import networkx as nx  # solo lo necesita python-louvain
+
+    N = A.shape[0]
+    G = nx.from_scipy_sparse_array(A, edge_attribute="weight")
+    partition = community_louvain.best_partition(G, weight="weight", random_state=42)
+    return np.fromiter((partition[i] for i in range(N)), dtype=np.int64, count=N)
+
+def louvain_partition(A) -> np.ndarray:
+    """Partición Louvain/Leiden (peso = multiplicidad) con el backend más rápido disponible."""
+    membership = None
+    try:
+        membership = louvain_cugraph(A)
+    except ImportError:
+        pass
+    except Exception as e:  # sin GPU/driver utilizable
+        warnings.warn(f"cugraph.louvain no disponible ({e}); se usa otro backend.")
+
+    for backend in (louvain_networkit, leiden_igraph, louvain_python):
+        if membership is not None:
+            break
+        try:
+            membership = backend(A)
+        except ImportError:
+            continue
+
+    if membership is None:
+        raise SystemExit(
+            "Falta un paquete de Louvain. Instala alguno con:\n"
+            "    pip install networkit        (paralelo, recomendado)\n"
+            "    pip install igraph           (Leiden, un solo hilo en C)\n"
+            "    pip install python-louvain   (un solo hilo)"
+        )
+    # Ids de comunidad contiguos 0..k-1, como python-louvain
+    return np.unique(membership, return_inverse=True)[1]
 
 def main():
     BASE_DIR = Path(__file__).resolve().parent
@@ -74,27 +125,23 @@ def main():
     if not INPUT_JSON.exists():
         raise FileNotFoundError(f"No existe {INPUT_JSON}")
 
-    G = load_property_graph(INPUT_JSON)
-    if G.number_of_nodes() == 0:
+    A, ids, labels = load_or_build_csr(INPUT_JSON)
+    if len(ids) == 0:
         print("Grafo vacío.")
         return
 
-    # Partición Louvain (usa peso si está disponible)
-    partition = community_louvain.best_partition(G, weight="weight", random_state=42)  # dict: node -> community_id
-
-    # Construir DataFrame simple (nombre y comunidad)
-    rows = []
-    for n in G.nodes():
-        rows.append({
-            "node_id": n,
-            "label": G.nodes[n].get("label") or "",
-            "community": partition.get(n)
-        })
+    # Partición Louvain, alineada con ids
+    community = louvain_partition(A)
 
-    df = pd.DataFrame(rows)
+    # Construir DataFrame simple por columnas (nombre y comunidad)
+    df = pd.DataFrame({
+        "node_id": ids,
+        "label": labels,
+        "community": community,
+    })
     df = df.sort_values(by=["community", "label"], ascending=[True, True])
 
-    df.to_csv(OUTPUT_CSV, index=False, encoding="utf-8-sig")
+    write_csv(df, OUTPUT_CSV)
     print(f"CSV generado: {OUTPUT_CSV.resolve()}  ({len(df)} nodos)")
 
 if __name__ == "__main__":
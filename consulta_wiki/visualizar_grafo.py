@@ -15,16 +15,34 @@ Qué hace por defecto:
 - Exporta PNG (300 DPI) y SVG en la carpeta data/
 
 Requisitos:
-    pip install networkx matplotlib
+    pip install networkx matplotlib numpy pandas scipy
+    (opcional) pip install orjson fa2_modified pyahocorasick datashader   (cugraph si hay GPU)
 """
 
-import json
 from pathlib import Path
 from math import sqrt
 import warnings
 
 import matplotlib.pyplot as plt
 import networkx as nx
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from grafo_csr import load_or_build_csr, node_degrees
+
+try:
+    import ahocorasick  # paquete: pyahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Layout ForceAtlas2: GPU (cugraph, importado en compute_layout) o Cython (fa2_modified);
+# si no hay ninguno, spring_layout
+# (el paquete "fa2" original no sirve: usa nx.to_scipy_sparse_matrix, eliminado en NetworkX 3)
+try:
+    from fa2_modified import ForceAtlas2
+except ImportError:
+    ForceAtlas2 = None
 
 # -------- Config por defecto --------
 INPUT_JSON = Path("data/grafo_unificado.json")
@@ -32,7 +50,10 @@ OUTPUT_PREFIX = INPUT_JSON.with_suffix("").parent / (INPUT_JSON.stem + "_viz")
 
 TOP_LABELS = 40        # nº de nodos etiquetados por grado
 DPI = 300              # alta resolución
+SVG_RASTER_DPI = 150   # resolución de las aristas rasterizadas dentro del SVG
+SVG_RASTER_EDGES_MIN = 2_000  # desde este nº de aristas se rasterizan en el SVG
 FIGSIZE = (14, 10)     # tamaño de figura
+RASTER_EDGES_MIN = 10_000  # desde este nº de aristas se rasterizan con datashader (si está)
 
 # Labels "ideales" esperados; si no coinciden exacto, se usa un fallback por keywords
 DEFAULT_SPECIAL_LABELS = {
@@ -48,50 +69,41 @@ SPECIAL_KEYWORDS = [
 ]
 
 
-def load_property_graph(json_path: Path) -> nx.MultiDiGraph:
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    G = nx.MultiDiGraph()
-    for n in data.get("nodes", []):
-        nid = n.get("id")
-        if nid:
-            G.add_node(nid, label=n.get("label") or "")
-    for e in data.get("edges", []):
-        src, dst = e.get("source"), e.get("target")
-        if src and dst:
-            # conservamos metadata mínima
-            G.add_edge(src, dst, property_label=e.get("property_label"))
+def to_simple_graph(A, ids, labels) -> nx.Graph:
+    """Colapsa la CSR simétrica -> Graph con peso = nº de aristas paralelas."""
+    G = nx.Graph()
+    G.add_nodes_from(zip(ids, ({"label": lab} for lab in labels)))
+    upper = sp.triu(A, format="coo")
+    G.add_weighted_edges_from(zip(ids[upper.row], ids[upper.col], upper.data.tolist()))
     return G
 
 
-def to_simple_graph(Gmulti: nx.MultiDiGraph) -> nx.Graph:
-    """Colapsa MultiDiGraph -> Graph sumando pesos por aristas paralelas."""
-    Gsimple = nx.Graph()
-    Gsimple.add_nodes_from(Gmulti.nodes(data=True))
-    for u, v, _k in Gmulti.edges(keys=True):
-        if Gsimple.has_edge(u, v):
-            Gsimple[u][v]["weight"] += 1
-        else:
-            Gsimple.add_edge(u, v, weight=1)
-    return Gsimple
+def score_node_size(deg, base=120, scale=35, exp=1.15, min_sz=60, max_sz=1200):
+    """Tamaño de nodo según grado (escalar o array), en un rango controlado."""
+    val = base + scale * np.power(np.asarray(deg, dtype=np.float64), exp)
+    return np.clip(val.astype(np.int32), min_sz, max_sz)
 
 
-def largest_connected_component(G: nx.Graph) -> nx.Graph:
-    """Devuelve la LCC (tratando como no dirigido)."""
-    if G.number_of_nodes() == 0:
-        return G
-    H = nx.Graph(G)
-    comps = list(nx.connected_components(H))
-    if not comps:
-        return G
-    giant = max(comps, key=len)
-    return H.subgraph(giant).copy()
+def keyword_matcher(keywords):
+    """
+    Devuelve f(texto) -> bool: ¿contiene alguna keyword (substring)?
+    Con pyahocorasick usa un autómata Aho-Corasick (una pasada en C por texto);
+    si no está instalado, recurre a la búsqueda por substring en Python.
+    """
+    if ahocorasick is None:
+        def matches(text):
+            return any(k in text for k in keywords)
+        return matches
 
+    automaton = ahocorasick.Automaton()
+    for kw in keywords:
+        automaton.add_word(kw, kw)
+    automaton.make_automaton()
 
-def score_node_size(deg, base=120, scale=35, exp=1.15, min_sz=60, max_sz=1200):
-    """Tamaño de nodo según grado, en un rango controlado."""
-    val = base + scale * (deg ** exp)
-    return max(min_sz, min(max_sz, int(val)))
+    def matches(text):
+        # corta en la primera coincidencia
+        return next(automaton.iter(text), None) is not None
+    return matches
 
 
 def detect_special_nodes(G: nx.Graph) -> set:
@@ -99,76 +111,163 @@ def detect_special_nodes(G: nx.Graph) -> set:
     Devuelve el conjunto de nodos "especiales".
     1) Intenta match EXACTO por label (DEFAULT_SPECIAL_LABELS)
     2) Si no encuentra alguno, activa fallback por SPECIAL_KEYWORDS (substring, case-insensitive)
+    Ambos criterios se evalúan en una sola pasada por los nodos.
     """
-    by_label = {n for n, d in G.nodes(data=True) if (d.get("label") or "") in DEFAULT_SPECIAL_LABELS}
+    has_keyword = keyword_matcher([k.lower() for k in SPECIAL_KEYWORDS])
+    by_label, by_kw = set(), set()
+    for n, d in G.nodes(data=True):
+        label = d.get("label") or ""
+        if label in DEFAULT_SPECIAL_LABELS:
+            by_label.add(n)
+        if has_keyword(label.lower()):
+            by_kw.add(n)
+
     # si ya encontró ambos (o todos los que existan), retorna
     if len(by_label) >= 2:
         return by_label
-
     # fallback por keywords
-    lower_kw = [k.lower() for k in SPECIAL_KEYWORDS]
-    by_kw = set(by_label)
-    for n, d in G.nodes(data=True):
-        label = (d.get("label") or "").lower()
-        if any(k in label for k in lower_kw):
-            by_kw.add(n)
-    return by_kw
+    return by_label | by_kw
+
 
+def pick_labels(node_ids, degree, top_k=TOP_LABELS, specials=frozenset()):
+    """Elige etiquetas: top-k por grado + TODOS los especiales (degree alineado con node_ids)."""
+    n = len(degree)
+    if top_k >= n:
+        top_idx = np.arange(n)
+    elif top_k <= 0:
+        top_idx = np.arange(0)
+    else:
+        # Selección O(N) del k-ésimo mayor grado; los empates en el corte se
+        # resuelven por orden de aparición (igual que un sort estable)
+        kth = np.partition(degree, n - top_k)[n - top_k]
+        above = np.flatnonzero(degree > kth)
+        ties = np.flatnonzero(degree == kth)[: top_k - len(above)]
+        top_idx = np.concatenate([above, ties])
+    return set(node_ids[top_idx]) | set(specials)
 
-def pick_labels(G: nx.Graph, top_k=TOP_LABELS, specials=frozenset()):
-    """Elige etiquetas: top-k por grado + TODOS los especiales."""
-    deg = dict(G.degree())
-    top_nodes = {n for n, _ in sorted(deg.items(), key=lambda x: x[1], reverse=True)[:top_k]}
-    return top_nodes | set(specials)
 
+def truncate(texts, maxlen=36) -> pd.Series:
+    """Recorta (vectorizado, vía .str) los textos de más de maxlen caracteres con '…'."""
+    s = pd.Series(texts, dtype=object).fillna("")
+    return s.where(s.str.len() <= maxlen, s.str.slice(0, maxlen - 1) + "…")
 
-def truncate(s: str, maxlen=36):
-    s = s or ""
-    return (s[: maxlen - 1] + "…") if len(s) > maxlen else s
 
+def compute_layout(G: nx.Graph, A, ids, iterations=200) -> dict:
+    """
+    Posiciones {nodo: (x, y)}.
+    1) ForceAtlas2 en GPU (cugraph.layout.force_atlas2) si hay GPU
+    2) ForceAtlas2 en Cython (fa2_modified)
+    3) Fallback: spring_layout de NetworkX (Python puro)
+    """
+    try:
+        import cudf  # RAPIDS tarda en cargar: solo se importa al intentar el layout en GPU
+        import cugraph
+
+        upper = sp.triu(A, format="coo")
+        edges = cudf.DataFrame({
+            "src": upper.row, "dst": upper.col, "w": upper.data.astype(np.float32),
+        })
+        g = cugraph.Graph()
+        g.from_cudf_edgelist(edges, source="src", destination="dst", edge_attr="w", renumber=False)
+        pos_df = cugraph.layout.force_atlas2(
+            g, max_iter=iterations, outbound_attraction_distribution=True,
+        ).to_pandas()
+        return {ids[v]: (x, y) for v, x, y in zip(pos_df["vertex"], pos_df["x"], pos_df["y"])}
+    except ImportError:
+        pass
+    except Exception as e:  # sin GPU/driver utilizable
+        warnings.warn(f"cugraph.force_atlas2 no disponible ({e}); se usa otro layout.")
+
+    if ForceAtlas2 is not None:
+        try:
+            fa = ForceAtlas2(scalingRatio=2.0, gravity=1.0, verbose=False)
+            # posiciones iniciales con semilla fija para que el dibujo sea reproducible
+            init = nx.random_layout(G, seed=42)
+            return fa.forceatlas2_networkx_layout(G, pos=init, iterations=iterations, weight_attr="weight")
+        except Exception as e:  # versión de fa2_modified incompatible con el NetworkX instalado
+            warnings.warn(f"ForceAtlas2 falló ({e}); se usa spring_layout.")
+
+    # Layout spring con separación razonable
+    k = 1.2 / max(1.0, sqrt(G.number_of_nodes()))
+    return nx.spring_layout(G, k=k, seed=42, iterations=iterations)
 
-def draw_graph(G: nx.Graph, output_prefix: Path):
+
+def draw_edges_raster(ax, A, ids, pos, width=2000, height=1500):
+    """
+    Rasteriza todas las aristas con datashader (una pasada vectorizada) y las
+    pinta en `ax` como una única imagen, en lugar de un Line2D por arista.
+    Devuelve False sin dibujar nada si datashader no está instalado.
+    """
+    try:
+        # solo se importa aquí: es lento de cargar y solo se usa con grafos grandes
+        import datashader as ds
+        import datashader.transfer_functions as tf
+    except ImportError:
+        return False
+
+    xy = np.array([pos[n] for n in ids], dtype=np.float64)
+    upper = sp.triu(A, format="coo")
+    segments = pd.DataFrame({
+        "x0": xy[upper.row, 0], "y0": xy[upper.row, 1],
+        "x1": xy[upper.col, 0], "y1": xy[upper.col, 1],
+    })
+
+    # Mismo rango (con margen) para el canvas y para la imagen en matplotlib
+    (x_min, y_min), (x_max, y_max) = xy.min(axis=0), xy.max(axis=0)
+    pad_x = 0.05 * (x_max - x_min or 1.0)
+    pad_y = 0.05 * (y_max - y_min or 1.0)
+    x_range = (x_min - pad_x, x_max + pad_x)
+    y_range = (y_min - pad_y, y_max + pad_y)
+
+    cvs = ds.Canvas(plot_width=width, plot_height=height, x_range=x_range, y_range=y_range)
+    agg = cvs.line(segments, x=["x0", "x1"], y=["y0", "y1"], axis=1, agg=ds.count())
+    img = tf.shade(agg, cmap=["#c8c8c8", "#505050"], how="eq_hist")
+    ax.imshow(
+        img.to_pil(), extent=(*x_range, *y_range), origin="upper",
+        aspect="auto", alpha=0.6, zorder=0,
+    )
+    return True
+
+
+def draw_graph(G: nx.Graph, A, ids, labels, output_prefix: Path):
+    """Dibuja G; A (CSR), ids y labels están alineados con el orden de G.nodes()."""
     if G.number_of_nodes() == 0:
         warnings.warn("Grafo vacío; no se generará imagen.")
         return
 
-    # Layout spring con separación razonable
-    n = G.number_of_nodes()
-    k = 1.2 / max(1.0, sqrt(n))
-    pos = nx.spring_layout(G, k=k, seed=42, iterations=200)
+    pos = compute_layout(G, A, ids)
 
-    deg = dict(G.degree())
+    degree = node_degrees(A)
     weights = [G[u][v].get("weight", 1) for u, v in G.edges()]
     max_w = max(weights) if weights else 1
 
     # Nodos especiales detectados (por label exacto o keywords)
     special_nodes = detect_special_nodes(G)
 
-    # Estética
-    node_sizes = []
-    node_colors = []
-    for node, data in G.nodes(data=True):
-        label = data.get("label") or ""
-        size = score_node_size(deg.get(node, 0))
-        if node in special_nodes:
-            size = int(size * 1.8)  # más grandes
-            color = "crimson"
-        else:
-            color = "gold"
-        node_sizes.append(size)
-        node_colors.append(color)
+    # Estética (vectorizada; los especiales más grandes y en crimson)
+    is_special = np.fromiter((n in special_nodes for n in ids), dtype=bool, count=len(ids))
+    node_sizes = score_node_size(degree)
+    node_sizes = np.where(is_special, (node_sizes * 1.8).astype(np.int32), node_sizes)
+    node_colors = np.where(is_special, "crimson", "gold").tolist()
 
     # Aristas MUY delgadas y discretas
     edge_widths = [0.25 + 0.9 * (w / max_w) for w in weights]
 
     # Dibujo
     plt.figure(figsize=FIGSIZE, dpi=DPI)
-    nx.draw_networkx_edges(
-        G, pos,
-        width=edge_widths,
-        alpha=0.22,
-        edge_color="gray"
-    )
+    ax = plt.gca()
+    # Muchas aristas: una sola imagen rasterizada con datashader (sin ancho por peso)
+    rasterized = G.number_of_edges() >= RASTER_EDGES_MIN and draw_edges_raster(ax, A, ids, pos)
+    if not rasterized:
+        edges = nx.draw_networkx_edges(
+            G, pos,
+            width=edge_widths,
+            alpha=0.22,
+            edge_color="gray"
+        )
+        # Con muchas aristas, en el SVG van como una sola imagen (nodos y etiquetas siguen vectoriales)
+        if G.number_of_edges() >= SVG_RASTER_EDGES_MIN:
+            edges.set_rasterized(True)
     nx.draw_networkx_nodes(
         G, pos,
         node_size=node_sizes,
@@ -178,19 +277,24 @@ def draw_graph(G: nx.Graph, output_prefix: Path):
     )
 
     # Etiquetas: top-k por grado + todos los especiales (siempre)
-    label_nodes = pick_labels(G, top_k=TOP_LABELS, specials=special_nodes)
-    labels = {n: truncate(d.get("label") or n, 34) for n, d in G.nodes(data=True) if n in label_nodes}
-
-    nx.draw_networkx_labels(
-        G, pos, labels=labels,
-        font_size=9,
-        font_weight="regular",
-        verticalalignment="center",
-        horizontalalignment="center",
-        bbox=dict(boxstyle="round,pad=0.22", fc="white", ec="black", alpha=0.65, lw=0.4)
-    )
-
-    title = f"Grafo • nodos={G.number_of_nodes()} • aristas={G.number_of_edges()} • etiquetas={len(labels)}"
+    label_nodes = pick_labels(ids, degree, top_k=TOP_LABELS, specials=special_nodes)
+    in_labels = np.fromiter((n in label_nodes for n in ids), dtype=bool, count=len(ids))
+    label_ids = ids[in_labels]
+    texts = np.where(labels[in_labels] != "", labels[in_labels], label_ids)  # sin label -> id
+    label_text = dict(zip(label_ids, truncate(texts, 34)))
+
+    # Un ax.text por etiqueta con el mismo dict de bbox (sin pasar por draw_networkx_labels)
+    bbox_props = dict(boxstyle="round,pad=0.22", fc="white", ec="black", alpha=0.65, lw=0.4)
+    for node, text in label_text.items():
+        x, y = pos[node]
+        ax.text(
+            x, y, text,
+            fontsize=9, family="sans-serif", color="k",
+            horizontalalignment="center", verticalalignment="center",
+            bbox=bbox_props, clip_on=True,
+        )
+
+    title = f"Grafo • nodos={G.number_of_nodes()} • aristas={G.number_of_edges()} • etiquetas={len(label_text)}"
     plt.title(title, fontsize=12)
     plt.axis("off")
 
@@ -198,7 +302,7 @@ def draw_graph(G: nx.Graph, output_prefix: Path):
     svg_path = output_prefix.with_suffix(".svg")
     plt.tight_layout(pad=0.5)
     plt.savefig(png_path, dpi=DPI)
-    plt.savefig(svg_path)
+    plt.savefig(svg_path, dpi=SVG_RASTER_DPI)
     plt.close()
     print(f"Visualización exportada:\n  - {png_path}\n  - {svg_path}")
 
@@ -206,13 +310,12 @@ def draw_graph(G: nx.Graph, output_prefix: Path):
 def main():
     if not INPUT_JSON.exists():
         raise FileNotFoundError(f"No existe el archivo de entrada: {INPUT_JSON.resolve()}")
-    # 1) Carga y colapso
-    Gm = load_property_graph(INPUT_JSON)
-    G = to_simple_graph(Gm)
-    # 2) LCC por defecto
-    G = largest_connected_component(G)
+    # 1) Carga, colapso y LCC sobre la CSR (cacheada junto al JSON)
+    A, ids, labels = load_or_build_csr(INPUT_JSON)
+    # 2) Grafo simple de NetworkX solo para layout y dibujo
+    G = to_simple_graph(A, ids, labels)
     # 3) Dibujo
-    draw_graph(G, OUTPUT_PREFIX)
+    draw_graph(G, A, ids, labels, OUTPUT_PREFIX)
 
 
 if __name__ == "__main__":
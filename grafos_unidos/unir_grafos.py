@@ -76,13 +76,17 @@ def analizar_grafo_combinado(grafo, grafo_qoyllur, grafo_virgen):
     print(f"• Nodos totales: {grafo.number_of_nodes()}")
     print(f"• Aristas totales: {grafo.number_of_edges()}")
     print(f"• Densidad: {nx.density(grafo):.6f}")
-    print(f"• Diámetro: {nx.diameter(grafo.to_undirected()) if nx.is_connected(grafo.to_undirected()) else 'No conectado'}")
-    print(f"• Radio: {nx.radius(grafo.to_undirected()) if nx.is_connected(grafo.to_undirected()) else 'N/A'}")
+    # Una sola copia no dirigida, reutilizada en todo el análisis (una vista
+    # recombinaría succ/pred en cada acceso durante los BFS de diámetro y radio)
+    no_dirigido = grafo.to_undirected()
+    conectado = nx.is_connected(no_dirigido)
+    print(f"• Diámetro: {nx.diameter(no_dirigido) if conectado else 'No conectado'}")
+    print(f"• Radio: {nx.radius(no_dirigido) if conectado else 'N/A'}")
     
     # 2. COMPONENTES CONECTADOS
     print("\n2. 🔗 COMPONENTES CONECTADOS")
     print("-" * 30)
-    componentes = list(nx.connected_components(grafo.to_undirected()))
+    componentes = list(nx.connected_components(no_dirigido))
     print(f"• Componentes conectados: {len(componentes)}")
     
     componente_principal = max(componentes, key=len)